@@ -1,15 +1,21 @@
 """
 OpenAI Realtime API client with async context manager support.
 """
-import json
+import asyncio
+import logging
+import re
+import socket
 import websockets
 from websockets import ClientConnection
-from typing import AsyncIterator, Optional, TYPE_CHECKING
+from websockets.exceptions import ConnectionClosedOK
+from websockets.protocol import State
+from typing import AsyncIterator, Optional, Set, TYPE_CHECKING
 
 from config import (
     OPENAI_API_KEY,
     OPENAI_REALTIME_URL,
     OPENAI_MODEL,
+    OPENAI_SOCKET_SNDBUF,
     TEMPERATURE,
     SYSTEM_MESSAGE,
     VOICE,
@@ -19,10 +25,27 @@ from config import (
     VAD_SILENCE_DURATION_MS,
     RAG_ENABLED,
 )
+from json_utils import dumps, loads
 
 if TYPE_CHECKING:
     from .qdrant_client import QdrantRAGClient
 
+logger = logging.getLogger(__name__)
+
+# Audio arrives from unauthenticated clients; only plain base64 may be spliced into the JSON template
+_is_base64 = re.compile(r'[A-Za-z0-9+/]*={0,2}').fullmatch
+
+
+def _tune_socket(sock) -> None:
+    """Apply low-latency options to the TCP socket under the OpenAI connection."""
+    try:
+        # Never hold small audio frames back waiting for ACKs (Nagle's algorithm)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if OPENAI_SOCKET_SNDBUF > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, OPENAI_SOCKET_SNDBUF)
+    except (OSError, AttributeError) as e:
+        logger.warning("Could not tune OpenAI socket: %s", e)
+
 
 class OpenAIRealtimeClient:
     """
@@ -46,8 +69,20 @@ class OpenAIRealtimeClient:
         self.audio_format = audio_format
         self.qdrant_client = qdrant_client if RAG_ENABLED else None
         self._ws: Optional[ClientConnection] = None
+        # In-flight RAG lookups; referenced here so they are not garbage collected mid-run
+        self._rag_tasks: Set[asyncio.Task] = set()
         self._url = f"{OPENAI_REALTIME_URL}?model={OPENAI_MODEL}&temperature={TEMPERATURE}"
 
+        # Pre-serialized envelopes for messages sent on every audio chunk or turn.
+        # Base64 audio never needs JSON escaping, so it can be spliced in directly.
+        self._audio_prefix = b'{"type":"input_audio_buffer.append","audio":"'
+        self._audio_suffix = b'"}'
+        self._response_create_msg = dumps({"type": "response.create"})
+        # Item IDs are server-generated identifiers that never need JSON escaping
+        self._truncate_tmpl = (
+            '{"type":"conversation.item.truncate","item_id":"%s","content_index":0,"audio_end_ms":%d}'
+        )
+
     async def __aenter__(self) -> "OpenAIRealtimeClient":
         """Connect to OpenAI Realtime API and initialize session."""
         self._ws = await websockets.connect(
@@ -56,18 +91,23 @@ class OpenAIRealtimeClient:
                 "Authorization": f"Bearer {OPENAI_API_KEY}"
             }
         )
+        sock = self._ws.transport.get_extra_info('socket')
+        if sock is not None:
+            _tune_socket(sock)
         await self._initialize_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Close the WebSocket connection."""
-        if self._ws and self._ws.state.name == 'OPEN':
+        """Cancel pending RAG lookups and close the WebSocket connection."""
+        for task in self._rag_tasks:
+            task.cancel()
+        if self._ws and self._ws.state is State.OPEN:
             await self._ws.close()
 
     @property
     def is_open(self) -> bool:
         """Check if the WebSocket connection is open."""
-        return self._ws is not None and self._ws.state.name == 'OPEN'
+        return self._ws is not None and self._ws.state is State.OPEN
 
     async def _initialize_session(self):
         """Configure the OpenAI Realtime session."""
@@ -105,8 +145,10 @@ class OpenAIRealtimeClient:
                 "model": "gpt-4o-transcribe"
             }
         
-        print('Sending session update:', json.dumps(session_update))
-        await self._ws.send(json.dumps(session_update))
+        payload = dumps(session_update)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending session update: %s", payload.decode('utf-8'))
+        await self._ws.send(payload, text=True)
 
     async def send_audio(self, audio_data: str):
         """
@@ -118,11 +160,12 @@ class OpenAIRealtimeClient:
         if not self.is_open or self._ws is None:
             return
 
-        audio_append = {
-            "type": "input_audio_buffer.append",
-            "audio": audio_data
-        }
-        await self._ws.send(json.dumps(audio_append))
+        if _is_base64(audio_data):
+            message = self._audio_prefix + audio_data.encode('ascii') + self._audio_suffix
+        else:
+            # Anything else goes through the encoder so it cannot escape the "audio" string
+            message = dumps({"type": "input_audio_buffer.append", "audio": audio_data})
+        await self._ws.send(message, text=True)
 
     async def send_truncate(self, item_id: str, audio_end_ms: int):
         """
@@ -135,13 +178,7 @@ class OpenAIRealtimeClient:
         if not self.is_open or self._ws is None:
             return
 
-        truncate_event = {
-            "type": "conversation.item.truncate",
-            "item_id": item_id,
-            "content_index": 0,
-            "audio_end_ms": audio_end_ms
-        }
-        await self._ws.send(json.dumps(truncate_event))
+        await self._ws.send(self._truncate_tmpl % (item_id, audio_end_ms))
 
     async def send_initial_greeting(self, greeting_text: Optional[str] = None):
         """
@@ -173,8 +210,8 @@ class OpenAIRealtimeClient:
                 ]
             }
         }
-        await self._ws.send(json.dumps(initial_conversation_item))
-        await self._ws.send(json.dumps({"type": "response.create"}))
+        await self._ws.send(dumps(initial_conversation_item), text=True)
+        await self._ws.send(self._response_create_msg, text=True)
 
     async def _inject_rag_context(self, user_query: str):
         """
@@ -205,10 +242,10 @@ class OpenAIRealtimeClient:
                         ]
                     }
                 }
-                await self._ws.send(json.dumps(context_message))
-                print(f"Injected RAG context for query: {user_query[:100]}...")
+                await self._ws.send(dumps(context_message), text=True)
+                logger.debug("Injected RAG context for query: %.100s...", user_query)
         except Exception as e:
-            print(f"Error injecting RAG context: {e}")
+            logger.error("Error injecting RAG context: %s", e)
 
     async def iter_events(self) -> AsyncIterator[dict]:
         """
@@ -220,22 +257,31 @@ class OpenAIRealtimeClient:
         if self._ws is None:
             return
             
-        async for message in self._ws:
-            event = json.loads(message)
+        recv = self._ws.recv
+        try:
+            while True:
+                # decode=False skips UTF-8 decoding of text frames; the JSON parser takes bytes
+                message = await recv(decode=False)
+                event = loads(message)
 
-            # Log configured event types
-            if event.get('type') in LOG_EVENT_TYPES:
-                print(f"Received event: {event['type']}", event)
+                # Log configured event types
+                if event.get('type') in LOG_EVENT_TYPES:
+                    logger.info("Received event: %s %s", event['type'], event)
 
-            # Handle transcription completion for RAG
-            if RAG_ENABLED and event.get('type') == 'conversation.item.input_audio_transcription.completed':
-                transcript = event.get('transcript', '')
-                if transcript:
-                    await self._inject_rag_context(transcript)
+                # Handle transcription completion for RAG
+                if RAG_ENABLED and event.get('type') == 'conversation.item.input_audio_transcription.completed':
+                    transcript = event.get('transcript', '')
+                    if transcript:
+                        # Run retrieval in the background so audio events keep flowing
+                        task = asyncio.create_task(self._inject_rag_context(transcript))
+                        self._rag_tasks.add(task)
+                        task.add_done_callback(self._rag_tasks.discard)
 
-            yield event
+                yield event
+        except ConnectionClosedOK:
+            return
 
     async def close(self):
         """Manually close the WebSocket connection."""
-        if self._ws and self._ws.state.name == 'OPEN':
+        if self._ws and self._ws.state is State.OPEN:
             await self._ws.close()
\ No newline at end of file
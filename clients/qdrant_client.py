@@ -2,8 +2,14 @@
 Qdrant RAG client for retrieving knowledge from vector database using LiteLLM embeddings.
 """
 import asyncio
+import functools
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
+import numpy as np
+
 from config import (
     QDRANT_URL,
     QDRANT_API_KEY,
@@ -13,6 +19,17 @@ from config import (
     LITELLM_API_KEY,
 )
 
+logger = logging.getLogger(__name__)
+
+# Bounded worker pool for the blocking LiteLLM and Qdrant calls, shared by every
+# connection so concurrent calls cannot each spawn their own threads
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="qdrant")
+
+# LRU cache of embeddings keyed by normalized text (greetings, small talk, repeats),
+# kept across connections so phrases repeated between calls hit it too
+_embed_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+_EMBED_CACHE_SIZE = 512
+
 
 class QdrantRAGClient:
     """
@@ -28,6 +45,11 @@ class QdrantRAGClient:
             from qdrant_client import QdrantClient
         except ImportError:
             raise ImportError("qdrant-client not installed. Run: pip install qdrant-client")
+        try:
+            from litellm import embedding
+        except ImportError:
+            raise ImportError("litellm not installed. Run: pip install litellm")
+        self._embedding = embedding
         
         # Use LiteLLM API key if set, otherwise fall back to OpenAI API key
         self.api_key = LITELLM_API_KEY or OPENAI_API_KEY
@@ -42,7 +64,11 @@ class QdrantRAGClient:
         )
         self.collection_name = QDRANT_COLLECTION
 
-    async def embed(self, text: str) -> List[float]:
+    def close(self):
+        """Release the Qdrant connection held by this client."""
+        self.client.close()
+
+    async def embed(self, text: str) -> np.ndarray:
         """
         Generate embedding for text using LiteLLM.
         
@@ -50,29 +76,39 @@ class QdrantRAGClient:
             text: Text to embed
             
         Returns:
-            List of floats representing the embedding vector
+            float32 array holding the embedding vector (empty on failure)
         """
-        try:
-            from litellm import embedding
-        except ImportError:
-            raise ImportError("litellm not installed. Run: pip install litellm")
+        cache_key = text.strip().lower()
+        cached = _embed_cache.get(cache_key)
+        if cached is not None:
+            _embed_cache.move_to_end(cache_key)
+            return cached
         
         try:
             # Use asyncio to run blocking LiteLLM call
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             response = await loop.run_in_executor(
-                None,
-                lambda: embedding(
+                _executor,
+                functools.partial(
+                    self._embedding,
                     model="text-embedding-3-large",
                     input=text,
                     api_key=self.api_key
                 )
             )
-            # Extract embedding vector from response
-            return response['data'][0]['embedding']
+            # Extract embedding vector from response as one contiguous float32 buffer
+            vector = np.asarray(response['data'][0]['embedding'], dtype=np.float32)
         except Exception as e:
-            print(f"Error generating embedding: {e}")
-            return []
+            logger.error("Error generating embedding: %s", e)
+            return np.empty(0, dtype=np.float32)
+
+        # Cached vectors are shared between calls, so keep them immutable
+        vector.setflags(write=False)
+
+        _embed_cache[cache_key] = vector
+        if len(_embed_cache) > _EMBED_CACHE_SIZE:
+            _embed_cache.popitem(last=False)
+        return vector
 
     async def search(self, query: str, top_k: Optional[int] = None) -> List[dict]:
         """
@@ -92,15 +128,16 @@ class QdrantRAGClient:
             # Generate embedding for the query
             query_embedding = await self.embed(query)
             
-            if not query_embedding:
-                print("Failed to generate query embedding")
+            if query_embedding.size == 0:
+                logger.warning("Failed to generate query embedding")
                 return []
             
             # Search in Qdrant
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             search_results = await loop.run_in_executor(
-                None,
-                lambda: self.client.search(
+                _executor,
+                functools.partial(
+                    self.client.search,
                     collection_name=self.collection_name,
                     query_vector=query_embedding,
                     limit=top_k,
@@ -120,7 +157,7 @@ class QdrantRAGClient:
             
             return documents
         except Exception as e:
-            print(f"Error searching Qdrant: {e}")
+            logger.error("Error searching Qdrant: %s", e)
             return []
 
     def format_context(self, results: List[dict]) -> str:
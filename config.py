@@ -10,9 +10,11 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_REALTIME_URL = "wss://api.openai.com/v1/realtime"
 OPENAI_MODEL = "gpt-realtime"
+OPENAI_SOCKET_SNDBUF = int(os.getenv('OPENAI_SOCKET_SNDBUF', 0))  # Send buffer bytes for the OpenAI socket (0 = kernel auto-tuning)
 
 # Server Configuration
 PORT = int(os.getenv('PORT', 5050))
+PUBLIC_HOST = os.getenv('PUBLIC_HOST')  # Fixed public hostname (e.g. abc123.ngrok.app); serves /incoming-call as static TwiML
 TEMPERATURE = float(os.getenv('TEMPERATURE', 0.8))
 
 # Voice Assistant Configuration
@@ -33,6 +35,14 @@ VOICE = 'alloy'
 AUDIO_FORMAT_TWILIO = "audio/pcmu"  # μ-law 8kHz for Twilio
 AUDIO_FORMAT_PCM16 = "audio/pcm16"   # PCM16 24kHz for browser mic
 
+# Browser Audio Forwarding Configuration
+AUDIO_COALESCE_MS = int(os.getenv('AUDIO_COALESCE_MS', 20))  # Max time to hold mic audio before sending (0 = only batch what is queued)
+AUDIO_COALESCE_MAX_BYTES = int(os.getenv('AUDIO_COALESCE_MAX_BYTES', 4800))  # Max decoded audio per send (4800 = 100ms of PCM16 24kHz)
+
+# Twilio Audio Forwarding Configuration
+TWILIO_COALESCE_MS = int(os.getenv('TWILIO_COALESCE_MS', 20))  # Max time to hold OpenAI audio before a Twilio media event (0 = send each delta)
+TWILIO_COALESCE_MAX_BYTES = int(os.getenv('TWILIO_COALESCE_MAX_BYTES', 1600))  # Max decoded audio per media event (1600 = 200ms of μ-law 8kHz)
+
 # Voice Activity Detection (VAD) Configuration
 VAD_THRESHOLD = float(os.getenv('VAD_THRESHOLD', 0.5))  # 0.0-1.0, sensitivity for speech detection
 VAD_PREFIX_PADDING_MS = int(os.getenv('VAD_PREFIX_PADDING_MS', 300))  # Audio to include before speech
@@ -47,12 +57,13 @@ RAG_TOP_K = int(os.getenv('RAG_TOP_K', 3))  # Number of documents to retrieve
 LITELLM_API_KEY = os.getenv('LITELLM_API_KEY', '')  # Uses OPENAI_API_KEY if not set
 
 # Logging Configuration
-LOG_EVENT_TYPES = [
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()  # DEBUG shows per-response and interruption details
+LOG_EVENT_TYPES = frozenset({
     'error', 'response.content.done', 'rate_limits.updated',
     'response.done', 'input_audio_buffer.committed',
     'input_audio_buffer.speech_stopped', 'input_audio_buffer.speech_started',
     'session.created', 'session.updated'
-]
+})
 SHOW_TIMING_MATH = False
 
 # Validation
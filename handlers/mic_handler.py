@@ -2,38 +2,55 @@
 Browser microphone WebSocket handler.
 """
 import asyncio
-import base64
+import logging
+import re
 from dataclasses import dataclass
 from typing import Optional
 from fastapi import APIRouter, WebSocket
-from fastapi.websockets import WebSocketDisconnect
 
-from config import AUDIO_FORMAT_PCM16, RAG_ENABLED
+from config import AUDIO_FORMAT_PCM16, RAG_ENABLED, AUDIO_COALESCE_MS, AUDIO_COALESCE_MAX_BYTES
 from clients import OpenAIRealtimeClient, QdrantRAGClient
+from json_utils import dumps_str, loads
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# mic_client.html sends audio as JSON.stringify({type: 'audio', data: base64})
+_AUDIO_MESSAGE_PREFIX = '{"type":"audio","data":"'
+_AUDIO_MESSAGE_SUFFIX = '"}'
+
+# Browser audio is forwarded only when it is plain base64 (no quotes, escapes or other JSON)
+_is_base64 = re.compile(r'[A-Za-z0-9+/]*={0,2}').fullmatch
+
 
 @dataclass
 class MicStreamState:
     """State tracking for microphone stream interruption handling."""
     last_assistant_item: Optional[str] = None
     response_start_timestamp: Optional[float] = None
-    total_bytes_sent: int = 0
+    total_b64_len: int = 0
     is_responding: bool = False
 
+    @property
+    def audio_end_ms(self) -> int:
+        """Milliseconds of audio sent to the browser for the current response."""
+        # 4 base64 chars encode 3 bytes; at 24kHz PCM16 that is 48 bytes per millisecond.
+        # Per-delta padding is ignored, which is at most 2 bytes (<0.05ms) per delta.
+        return (self.total_b64_len // 4) * 3 // 48
+
     def reset(self):
         """Reset state after interruption or response completion."""
         self.last_assistant_item = None
         self.response_start_timestamp = None
-        self.total_bytes_sent = 0
+        self.total_b64_len = 0
         self.is_responding = False
 
 
 @router.websocket("/mic-stream")
 async def handle_mic_stream(websocket: WebSocket):
     """Handle WebSocket connections between browser microphone and OpenAI."""
-    print("Microphone client connected")
+    logger.info("Microphone client connected")
     await websocket.accept()
 
     state = MicStreamState()
@@ -43,24 +60,88 @@ async def handle_mic_stream(websocket: WebSocket):
     if RAG_ENABLED:
         try:
             qdrant_client = QdrantRAGClient()
-            print("Qdrant RAG client initialized")
+            logger.info("Qdrant RAG client initialized")
         except Exception as e:
-            print(f"Failed to initialize Qdrant RAG client: {e}")
+            logger.warning("Failed to initialize Qdrant RAG client: %s", e)
 
     async with OpenAIRealtimeClient(audio_format=AUDIO_FORMAT_PCM16, qdrant_client=qdrant_client) as openai_client:
 
+        # Browser audio chunks waiting to be forwarded; None marks the end of the stream
+        audio_queue: asyncio.Queue[Optional[str]] = asyncio.Queue()
+
+        # Serialized messages for the browser, sent by a single writer; None stops the writer
+        outbound: asyncio.Queue[Optional[str]] = asyncio.Queue(maxsize=256)
+
         async def receive_from_client():
-            """Receive audio data from the browser client and send it to OpenAI."""
+            """Receive audio data from the browser client and queue it for OpenAI."""
             try:
+                prefix_len = len(_AUDIO_MESSAGE_PREFIX)
+                suffix_len = len(_AUDIO_MESSAGE_SUFFIX)
                 async for message in websocket.iter_text():
-                    import json
-                    data = json.loads(message)
+                    # Fast path: slice base64 audio out of the fixed-shape message without parsing
+                    if message.startswith(_AUDIO_MESSAGE_PREFIX) and message.endswith(_AUDIO_MESSAGE_SUFFIX):
+                        audio = message[prefix_len:-suffix_len]
+                        # Anything else (extra fields, escapes) goes through the parser
+                        if _is_base64(audio):
+                            if openai_client.is_open:
+                                audio_queue.put_nowait(audio)
+                            continue
+
+                    try:
+                        data = loads(message)
+                    except ValueError:
+                        logger.debug("Dropping malformed message from microphone client")
+                        continue
                     if data.get('type') == 'audio' and openai_client.is_open:
-                        await openai_client.send_audio(data['data'])
-            except WebSocketDisconnect:
-                print("Microphone client disconnected.")
+                        audio = data.get('data')
+                        if isinstance(audio, str) and _is_base64(audio):
+                            audio_queue.put_nowait(audio)
+                        else:
+                            logger.debug("Dropping non-base64 audio chunk from microphone client")
+                # iter_text() ends quietly when the browser disconnects
+                logger.info("Microphone client disconnected.")
+            finally:
+                audio_queue.put_nowait(None)
+                # Closing OpenAI ends iter_events() so send_to_client stops too
                 await openai_client.close()
 
+        async def forward_audio():
+            """Send queued browser audio to OpenAI, coalescing chunks that arrive close together."""
+            loop = asyncio.get_running_loop()
+            window = AUDIO_COALESCE_MS / 1000
+            max_chars = AUDIO_COALESCE_MAX_BYTES * 4 // 3
+            finished = False
+
+            while not finished:
+                chunk = await audio_queue.get()
+                if chunk is None:
+                    break
+
+                batch = [chunk]
+                size = len(chunk)
+                deadline = loop.time() + window
+
+                # Base64 strings can only be concatenated while no chunk carries padding
+                while size < max_chars and not chunk.endswith('='):
+                    if audio_queue.empty():
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            chunk = await asyncio.wait_for(audio_queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                    else:
+                        chunk = audio_queue.get_nowait()
+
+                    if chunk is None:
+                        finished = True
+                        break
+                    batch.append(chunk)
+                    size += len(chunk)
+
+                await openai_client.send_audio(''.join(batch))
+
         async def send_to_client():
             """Receive events from OpenAI and send audio back to the browser client."""
             try:
@@ -73,57 +154,75 @@ async def handle_mic_stream(websocket: WebSocket):
                         
                         # Track new response starting
                         if item_id and item_id != state.last_assistant_item:
-                            print(f"New response started: {item_id}")
+                            logger.debug("New response started: %s", item_id)
                             state.last_assistant_item = item_id
-                            state.total_bytes_sent = 0
+                            state.total_b64_len = 0
                             state.is_responding = True
                             
                             # Notify browser that new response started
-                            await websocket.send_json({
+                            await outbound.put(dumps_str({
                                 "type": "response_start",
                                 "item_id": item_id
-                            })
+                            }))
                         
-                        # Calculate bytes from base64 delta
-                        audio_bytes = len(base64.b64decode(event['delta']))
-                        state.total_bytes_sent += audio_bytes
+                        # Track sent audio as base64 length; converted to ms only on interruption
+                        state.total_b64_len += len(event['delta'])
                         
                         # Send audio to browser
-                        await websocket.send_json({
+                        await outbound.put(dumps_str({
                             "type": "audio",
                             "data": event['delta'],
                             "item_id": item_id
-                        })
+                        }))
 
                     # Handle user speech interruption
                     elif event_type == 'input_audio_buffer.speech_started':
-                        print("Speech started detected - handling interruption")
+                        logger.debug("Speech started detected - handling interruption")
                         
                         if state.last_assistant_item and state.is_responding:
                             # Calculate how much audio was sent (in milliseconds)
-                            # At 24kHz PCM16: 48 bytes per millisecond
-                            audio_end_ms = state.total_bytes_sent // 48
+                            audio_end_ms = state.audio_end_ms
                             
-                            print(f"Interrupting response {state.last_assistant_item} at {audio_end_ms}ms")
+                            logger.debug("Interrupting response %s at %sms", state.last_assistant_item, audio_end_ms)
                             
                             # Truncate the assistant's response at OpenAI
                             await openai_client.send_truncate(state.last_assistant_item, audio_end_ms)
                             
                             # Tell browser to stop playing audio
-                            await websocket.send_json({
+                            await outbound.put(dumps_str({
                                 "type": "stop_audio",
                                 "audio_end_ms": audio_end_ms
-                            })
+                            }))
                             
                             # Reset state to prevent duplicate truncates
                             state.reset()
 
                     # Handle response completion
                     elif event_type == 'response.done':
-                        print("Response completed")
+                        logger.debug("Response completed")
                         state.is_responding = False
 
             except Exception as e:
-                print(f"Error in send_to_client: {e}")
+                logger.error("Error in send_to_client: %s", e)
+            finally:
+                await outbound.put(None)
+
+        async def write_to_client():
+            """Send queued messages to the browser so only one task writes to the socket."""
+            connected = True
+            while (message := await outbound.get()) is not None:
+                if not connected:
+                    # Keep draining so producers never block on a dead socket
+                    continue
+                try:
+                    await websocket.send_text(message)
+                except Exception as e:
+                    logger.error("Error in write_to_client: %s", e)
+                    connected = False
+                    await openai_client.close()
 
-        await asyncio.gather(receive_from_client(), send_to_client())
\ No newline at end of file
+        try:
+            await asyncio.gather(receive_from_client(), forward_audio(), send_to_client(), write_to_client())
+        finally:
+            if qdrant_client is not None:
+                qdrant_client.close()
\ No newline at end of file
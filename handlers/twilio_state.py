@@ -0,0 +1,244 @@
+"""
+Per-stream state for the Twilio Media Stream relay.
+
+Fully annotated so it can be compiled with mypyc (see the Readme); the
+pure-Python module is imported whenever no compiled build is present.
+"""
+import asyncio
+import logging
+import sys
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Union
+
+from starlette.types import Message
+
+from config import SHOW_TIMING_MATH, TWILIO_COALESCE_MS, TWILIO_COALESCE_MAX_BYTES
+from clients import OpenAIRealtimeClient
+from json_utils import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+
+# OpenAI event types handled on the Twilio path
+_TYPE_AUDIO_DELTA = sys.intern('response.output_audio.delta')
+_TYPE_SPEECH_STARTED = sys.intern('input_audio_buffer.speech_started')
+
+# Closes the media event envelope after the base64 payload
+_MEDIA_SUFFIX = '"}}'
+
+_EventHandler = Callable[["TwilioStreamState", Dict[str, Any], OpenAIRealtimeClient], Awaitable[None]]
+
+
+class TwilioStreamState:
+    """Manages state for a Twilio Media Stream connection."""
+
+    __slots__ = (
+        "stream_sid",
+        "latest_media_timestamp",
+        "last_assistant_item",
+        "mark_queue",
+        "response_start_timestamp_twilio",
+        "_media_prefix",
+        "_mark_frame",
+        "_clear_frame",
+        "_send",
+        "_send_lock",
+        "_pending_audio",
+        "_pending_len",
+        "_flush_handle",
+        "_flush_task",
+    )
+
+    def __init__(self, send: Callable[[Message], Awaitable[None]]) -> None:
+        """
+        Initialize per-stream state.
+
+        Args:
+            send: The Twilio WebSocket's send(), called with ASGI websocket.send messages
+        """
+        self._send: Callable[[Message], Awaitable[None]] = send
+        self.stream_sid: Optional[str] = None
+        self.latest_media_timestamp: int = 0
+        self.last_assistant_item: Optional[str] = None
+        self.mark_queue: Deque[str] = deque()
+        self.response_start_timestamp_twilio: Optional[int] = None
+        self._media_prefix: str = ''
+        self._mark_frame: str = ''
+        self._clear_frame: str = ''
+        self._build_frames()
+
+        # Audio deltas held back briefly so several can share one media event
+        self._send_lock: asyncio.Lock = asyncio.Lock()
+        self._pending_audio: List[str] = []
+        self._pending_len: int = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task[None]] = None
+
+    def _build_frames(self) -> None:
+        """Pre-serialize the outgoing envelopes that only depend on the stream SID."""
+        media = dumps_str({"event": "media", "streamSid": self.stream_sid, "media": {"payload": ""}})
+        self._media_prefix = media[:-len(_MEDIA_SUFFIX)]
+        self._mark_frame = dumps_str({
+            "event": "mark",
+            "streamSid": self.stream_sid,
+            "mark": {"name": "responsePart"}
+        })
+        self._clear_frame = dumps_str({"event": "clear", "streamSid": self.stream_sid})
+
+    async def handle_twilio_message(self, message: Union[str, bytes], openai_client: OpenAIRealtimeClient) -> None:
+        """Process incoming Twilio Media Stream messages (text frames, or bytes which are parsed as-is)."""
+        data = loads(message)
+
+        if data['event'] == 'media' and openai_client.is_open:
+            self.latest_media_timestamp = int(data['media']['timestamp'])
+            await openai_client.send_audio(data['media']['payload'])
+
+        elif data['event'] == 'start':
+            self.stream_sid = data['start']['streamSid']
+            self._build_frames()
+            logger.info("Incoming stream has started %s", self.stream_sid)
+            self.response_start_timestamp_twilio = None
+            self.latest_media_timestamp = 0
+            self.last_assistant_item = None
+
+        elif data['event'] == 'mark':
+            if self.mark_queue:
+                self.mark_queue.popleft()
+
+    async def handle_openai_event(self, event: Dict[str, Any], openai_client: OpenAIRealtimeClient) -> None:
+        """Process OpenAI events and send responses to Twilio."""
+        handler = _EVENT_HANDLERS.get(event.get('type', ''))
+        if handler is not None:
+            await handler(self, event, openai_client)
+
+    async def _on_audio_delta(self, event: Dict[str, Any], openai_client: OpenAIRealtimeClient) -> None:
+        """Forward an audio delta to Twilio and track response timing."""
+        delta = event.get('delta')
+        if delta is None:
+            return
+
+        # Track response timing for interruption handling
+        item_id = event.get('item_id')
+        if item_id and item_id != self.last_assistant_item:
+            start_timestamp = self.latest_media_timestamp
+            self.response_start_timestamp_twilio = start_timestamp
+            self.last_assistant_item = item_id
+            if SHOW_TIMING_MATH:
+                logger.info("Setting start timestamp for new response: %sms", start_timestamp)
+
+        pending_audio = self._pending_audio
+        if TWILIO_COALESCE_MS <= 0:
+            pending_audio.append(delta)
+            await self._flush_audio()
+            return
+
+        if not pending_audio:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(TWILIO_COALESCE_MS / 1000, self._on_flush_timer)
+        pending_audio.append(delta)
+        pending_len = self._pending_len + len(delta)
+        self._pending_len = pending_len
+
+        # Base64 strings can only be joined while no delta carries padding
+        if delta.endswith('=') or pending_len >= TWILIO_COALESCE_MAX_BYTES * 4 // 3:
+            await self._flush_audio()
+
+    def _on_flush_timer(self) -> None:
+        """Flush buffered audio once the coalescing window has elapsed."""
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self._flush_audio())
+        self._flush_task.add_done_callback(self._on_flush_done)
+
+    def _on_flush_done(self, task: asyncio.Task[None]) -> None:
+        """Report failures of timer-driven flushes, which nothing else awaits."""
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error flushing audio to Twilio: %s", task.exception())
+
+    async def _flush_audio(self) -> None:
+        """Send buffered audio deltas to Twilio as a single media event followed by a mark."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending_audio:
+            return
+
+        # Keep each media event and its mark together when timer and inline flushes overlap
+        async with self._send_lock:
+            # Take the buffer only under the lock, so an interruption either discards it or sees the send
+            if not self._pending_audio:
+                return
+            # The delta is already base64 μ-law and needs no JSON escaping
+            payload = ''.join(self._pending_audio)
+            self._pending_audio.clear()
+            self._pending_len = 0
+            await self._send({"type": "websocket.send", "text": self._media_prefix + payload + _MEDIA_SUFFIX})
+            await self._send_mark()
+
+    def _discard_pending_audio(self) -> None:
+        """Drop buffered audio and cancel any scheduled flush."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending_audio.clear()
+        self._pending_len = 0
+
+    def close(self) -> None:
+        """Stop buffered audio delivery once the stream has ended."""
+        self._discard_pending_audio()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    async def _on_speech_started(self, event: Dict[str, Any], openai_client: OpenAIRealtimeClient) -> None:
+        """Interrupt the current response when the caller starts speaking."""
+        logger.debug("Speech started detected.")
+        if self.last_assistant_item:
+            logger.debug("Interrupting response with id: %s", self.last_assistant_item)
+            await self._handle_interruption(openai_client)
+
+    async def _send_mark(self) -> None:
+        """Send a mark event to Twilio for timing synchronization."""
+        if self.stream_sid:
+            await self._send({"type": "websocket.send", "text": self._mark_frame})
+            self.mark_queue.append('responsePart')
+
+    async def _handle_interruption(self, openai_client: OpenAIRealtimeClient) -> None:
+        """Handle interruption when the caller's speech starts."""
+        logger.debug("Handling speech started event.")
+
+        # Buffered audio or a media event still being sent has not been played yet
+        mark_queue = self.mark_queue
+        has_unplayed_audio = bool(mark_queue or self._pending_audio or self._send_lock.locked())
+        self._discard_pending_audio()
+
+        start_timestamp = self.response_start_timestamp_twilio
+        if has_unplayed_audio and start_timestamp is not None:
+            latest_timestamp = self.latest_media_timestamp
+            elapsed_time = latest_timestamp - start_timestamp
+            if SHOW_TIMING_MATH:
+                logger.info(
+                    "Calculating elapsed time for truncation: %s - %s = %sms",
+                    latest_timestamp, start_timestamp, elapsed_time,
+                )
+
+            item_id = self.last_assistant_item
+            if item_id:
+                if SHOW_TIMING_MATH:
+                    logger.info("Truncating item with ID: %s, Truncated at: %sms", item_id, elapsed_time)
+                await openai_client.send_truncate(item_id, elapsed_time)
+
+            # Send clear event to Twilio, after any media event that is already being sent
+            async with self._send_lock:
+                await self._send({"type": "websocket.send", "text": self._clear_frame})
+
+            mark_queue.clear()
+            self.last_assistant_item = None
+            self.response_start_timestamp_twilio = None
+
+
+# OpenAI event type -> handler; other event types are ignored. Built after the class
+# because mypyc does not expose methods inside the class body.
+_EVENT_HANDLERS: Dict[str, _EventHandler] = {
+    _TYPE_AUDIO_DELTA: TwilioStreamState._on_audio_delta,
+    _TYPE_SPEECH_STARTED: TwilioStreamState._on_speech_started,
+}
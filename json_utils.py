@@ -0,0 +1,30 @@
+"""
+Fast JSON helpers for the WebSocket hot paths.
+
+Uses orjson when it is installed and falls back to the standard library json module.
+"""
+from typing import Any
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize an object to compact UTF-8 encoded JSON."""
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    HAS_ORJSON = False
+    loads = json.loads
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize an object to compact UTF-8 encoded JSON."""
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def dumps_str(obj: Any) -> str:
+    """Serialize an object to a compact JSON string (for text-only WebSocket APIs)."""
+    return dumps(obj).decode('utf-8')